@@ -5,10 +5,19 @@ This file holds the implementation of the base classes for the framework.
 import sys
 import logging
 import uuid
-from .experiment_exceptions import TrialAbort, TrialReset, StageAbort, StageReset, ExperimentAbort, ExperimentReset, Ignore, handle_exceptions
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from .experiment_exceptions import TrialAbort, TrialReset, StageAbort, StageReset, ExperimentAbort, ExperimentReset, Ignore, handle_exceptions, _next_error
 import time
 
 def _create_error_sequence(error_sequence):
+
+    # Experiment flattens each error sequence once and hands the same tuple to
+    # every Trial and Stage. Share an already flattened tuple as is.
+    if type(error_sequence) is tuple and \
+    all(e == 0 or issubclass(type(e), type) for e in error_sequence):
+        return error_sequence
+
     flat_sequence = list()
 
     # flattens the mixed list of tuples and exception classes to a list of
@@ -31,7 +40,31 @@ def _create_error_sequence(error_sequence):
         else:
             flat_sequence.append(e)
 
-    return flat_sequence
+    # a tuple, so the flattened sequence can be shared between objects
+    return tuple(flat_sequence)
+
+# Outcomes of calling a stage's start or is_done through _invoke
+_OK, _ABORT, _RESET, _IGNORE = range(4)
+
+def _invoke(fn, state):
+    """
+    Calls a stage's start or is_done method with the Trial state, turning the
+    exceptions a stage uses for flow control into a tag. This keeps a single
+    exception handler for all of the Trial.run handlers.
+
+    Returns:
+        (tag, status, next_state)
+    """
+
+    try:
+        status, next_state = fn(**state)
+    except StageAbort:
+        return (_ABORT, 0, None)
+    except StageReset:
+        return (_RESET, 0, None)
+    except Ignore:
+        return (_IGNORE, 0, None)
+    return (_OK, status, next_state)
 
 
 class Stage:
@@ -47,14 +80,24 @@ class Stage:
     forever. This is useful for preventing errors from elevating to the Trial.
     For example, an error_sequence of [(Ignore, 0)] will ignore unexpected
     exceptions forever.
+
+    Experiment calls start and is_done from a thread pool, so calls for
+    different trial instances may run at the same time. Each trial instance
+    has its own stage objects, but anything shared between them (class
+    attributes, module globals, clients) has to be thread safe, or the
+    Experiment run with max_workers=None.
     """
 
-    def __init__(self, error_sequence = list()):
+    def __init__(self, error_sequence = None):
+        if error_sequence is None:
+            error_sequence = ()
         self.error_sequence = _create_error_sequence(error_sequence)
-        self.original_error_sequence = self.error_sequence.copy()
+        self.reset_error_sequence()
 
     def reset_error_sequence(self):
-        self.error_sequence = self.original_error_sequence.copy()
+        # error_sequence is never modified, handle_exceptions just moves
+        # error_index along it
+        self.error_index = 0
 
     def log(self, *args, **kwargs):
         pass
@@ -65,23 +108,45 @@ class Stage:
     def is_done(self, **kwargs):
         raise NotImplementedError
 
+    async def wait(self, timeout):
+        """
+        Awaited by Trial.run_async between polls of a stage. By default this
+        just sleeps for timeout seconds. Stages that can be notified when they
+        finish (events, callbacks, futures) should override this and await the
+        notification instead, so the Trial is woken as soon as it's ready.
+        """
+
+        await asyncio.sleep(timeout)
+
 class BlockingStage:
 
-    def __init__(self, error_sequence = list()):
+    def __init__(self, error_sequence = None):
+        if error_sequence is None:
+            error_sequence = ()
         self.error_sequence = _create_error_sequence(error_sequence)
-        self.original_error_sequence = self.error_sequence.copy()
+        self.reset_error_sequence()
 
     def reset_error_sequence(self):
-        self.error_sequence = self.original_error_sequence.copy()
+        # error_sequence is never modified, handle_exceptions just moves
+        # error_index along it
+        self.error_index = 0
 
     def start(self):
         raise NotImplementedError
 
+    async def wait(self, timeout):
+        """
+        Awaited by Trial.run_async before retrying a start that returned a
+        status of 0.
+        """
+
+        await asyncio.sleep(timeout)
+
 class TrialResults:
 
-    def __init__(self, data = list(), metadata = dict()):
-        self.data = data
-        self.metadata = metadata
+    def __init__(self, data = None, metadata = None):
+        self.data = [] if data is None else data
+        self.metadata = {} if metadata is None else metadata
 
     def __bool__(self):
         return True
@@ -97,25 +162,41 @@ class TrialResults:
 
 class Trial:
 
-    def __init__(self, stages, initial_state, error_sequence=list(), results = TrialResults()):
+    def __init__(self, stages, initial_state, error_sequence=None, results = None):
+        if error_sequence is None:
+            error_sequence = ()
         self.error_sequence = _create_error_sequence(error_sequence)
-        self.original_error_sequence = self.error_sequence.copy()
-        self.state = initial_state.copy()
+        self.reset_error_sequence()
         self.initial_state = initial_state.copy()
-        self.state_checkpoint = initial_state.copy()
+        self.set_state(self.initial_state.copy())
         self.stage_index = 0
         self.stages = stages
+        self.running = False
 
-        # Give each stage a copy of the error sequence
-        # This is faster than building an error sequence for every individual
-        # stage
+        # Resolve the run handler for each stage once, rather than checking
+        # the stage type and running status on every call of run. The handler
+        # for the current stage is self._dispatch[self.stage_index][self.running]
+        # The stage type and bound start/is_done methods are cached per stage
+        # for the same reason.
+        self._dispatch = list()
+        self._is_blocking = list()
+        self._start_fns = list()
+        self._done_fns = list()
         for stage in self.stages:
-            stage.error_sequence = stage.error_sequence.copy()
+            is_blocking = isinstance(stage, BlockingStage)
+            if is_blocking:
+                self._dispatch.append((self._start_blocking_stage, self._start_blocking_stage))
+            else:
+                self._dispatch.append((self._start_stage, self._poll_stage))
+            self._is_blocking.append(is_blocking)
+            self._start_fns.append(stage.start)
+            self._done_fns.append(getattr(stage, "is_done", None))
 
-        self.stages = stages
-        self.running = False
-        self.initial_results = results.copy()
-        self.results = self.initial_results.copy()
+        # if no results were given, every trial starts with new, empty
+        # TrialResults and there's nothing to copy
+        self._default_results = results is None
+        self.initial_results = TrialResults() if results is None else results.copy()
+        self.results = self.new_results()
 
         # At init, set done to true. This will trigger the experiment to fetch
         # args for the trial and pass them through new_trial, if there are any
@@ -126,20 +207,66 @@ class Trial:
         self.errors = 0
         self.fails = 0
 
+    @property
+    def results(self):
+        return self._results
+
+    @results.setter
+    def results(self, results):
+        # stages can add results on any call of run, so bind add_data once
+        # each time the results are replaced rather than looking it up then
+        self._results = results
+        self._add_result = results.add_data
+
+    def set_state(self, state):
+        """
+        Replaces the state. Until a stage starts and takes its own
+        checkpoint, the checkpoint is initial_state itself rather than a copy
+        of it. reset_stage copies it if it ever has to roll back to it.
+        """
+
+        self.state = state
+        self.state_checkpoint = self.initial_state
+
+    def checkpoint_state(self):
+        """
+        Saves a copy of the state for reset_stage to roll back to.
+        """
+
+        self.state_checkpoint = self.state.copy()
+
+    def reset_error_sequence(self):
+        self.error_index = 0
+
+    def new_results(self):
+        """
+        Returns the TrialResults to start a trial with.
+        """
+
+        if self._default_results:
+            return TrialResults()
+        return self.initial_results.copy()
+
     def reset_stage(self):
         self.unset_running()
-        self.state = self.state_checkpoint.copy()
+
+        # the stage takes a new checkpoint when it's restarted, so the
+        # checkpoint can become the state without being copied again. The
+        # shared initial_state is the exception.
+        if self.state_checkpoint is self.initial_state:
+            self.state = self.initial_state.copy()
+        else:
+            self.state = self.state_checkpoint
 
     def reset(self):
-        self.state = self.initial_state.copy()
-        self.state_checkpoint = self.state.copy()
+        self.set_state(self.initial_state.copy())
         self.state.update(self.stage_args[0])
         self.done = False
         self.multiple_results = False
         self.stage_index = 0
         self.errors = 0
         self.unset_running()
-        self.results = self.initial_results.copy()
+        self.results = self.new_results()
 
         # reset stage error sequences since trials reuse the same stage
         # objects
@@ -155,17 +282,16 @@ class Trial:
     def new_trial(self, stage_args = None, **kwargs):
         if stage_args == None:
             stage_args = [{}] * len(self.stages)
-        self.error_sequence = self.original_error_sequence.copy()
+        self.reset_error_sequence()
         self.initial_state.update(kwargs)
-        self.state = self.initial_state.copy()
-        self.state_checkpoint = self.state.copy()
+        self.set_state(self.initial_state.copy())
         self.stage_args = stage_args
         self.state.update(stage_args[0])
         self.done = False
         self.multiple_results = False
         self.stage_index = 0
         self.errors = 0
-        self.results = self.initial_results.copy()
+        self.results = self.new_results()
         self.unset_running()
 
         # reset stage error sequences
@@ -208,130 +334,188 @@ class Trial:
 
         return self.running
 
-    @handle_exceptions
     def run(self):
 
-        # local variable to track whether the Trial finishes on this call of
-        # run.
-        just_finished = 0
-
         # if the Trial is already done, return immediately
-        if self.is_done():
+        if self.done:
             return (1, None)
 
-        current_stage = self.stages[self.stage_index]
+        # look up the handler for the current stage and whether it's running.
+        # run is called on every poll, so this does the same exception
+        # handling as @handle_exceptions inline rather than through a wrapper.
+        try:
+            return self._dispatch[self.stage_index][self.running]()
 
-        # the current stage of the Trial is not running yet
-        if not self.running:
+        # if any of these exceptions are raised manually, bypass the error
+        # sequence
+        except (TrialAbort, TrialReset, StageAbort, StageReset):
+            raise
 
-            # create a snapshot of the current state in case the stage has to
-            # be restarted
-            self.state_checkpoint = self.state.copy()
+        except Exception as err:
+            logging.exception(err)
+            error = _next_error(self)
+            if error is None:
+                raise
+            raise error
 
-            # start the current stage
+    def _finish_stage(self):
+        """
+        Moves on to the next stage. If that was the last stage, marks the
+        Trial as done and returns its results.
+        """
 
-            # for blocking stages, the final results are returned directly by
-            # the start method.
-            if isinstance(current_stage, BlockingStage):
+        self.next_stage()
+        if self.stage_index == len(self.stages):
+            self.done = True
+            return (1, self.results)
+        return (0, None)
 
-                # start stage, wait to finish, update state. if success, move on
-                try:
-                    status, next_state = current_stage.start(**self.state)
+    def _update_state(self, next_state):
+        """
+        Applies the state returned by a stage.
+        """
 
-                # set status to 1 to continue to the next stage
-                except StageAbort:
-                    status, next_state = (1, dict())
+        # trial results gets appended rather than overwritten when it
+        # appears in next_state
+        trial_results = next_state.get("trial_results")
+        if trial_results is not None:
+            self._add_result(trial_results)
 
-                # for blocking stages, StageReset == Ignore. set status to 0,
-                # and it try again on the next Trial.run
-                except (StageReset, Ignore):
-                    status, next_state = (0, dict())
+        # update the state
+        self.state.update(next_state)
 
-                # trial results gets appended rather than overwritten when it
-                # appears in next_state
-                if "trial_results" in next_state:
-                    self.results.add_data(next_state["trial_results"])
+    def _start_blocking_stage(self):
+        """
+        Run handler for a BlockingStage. The final results are returned
+        directly by the start method, so the stage is never left running.
+        """
 
-                # update the state
-                self.state.update(next_state)
+        # a StageReset is treated as Ignore for blocking stages, so they never
+        # roll back to a checkpoint and don't need one.
+        # start stage, wait to finish, update state. if success, move on
+        tag, status, next_state = _invoke(self._start_fns[self.stage_index], self.state)
 
-                # mark the stage as "just_finished" and setup the next stage
-                if status:
-                    just_finished = 1
-                    self.next_stage()
+        # continue to the next stage
+        if tag == _ABORT:
+            return self._finish_stage()
 
-            # normal stage, just start it
-            else:
+        # for blocking stages, StageReset == Ignore. it's tried again on the
+        # next Trial.run
+        if tag != _OK:
+            return (0, None)
 
-                # start the stage. if starting succeeds, update status to running
-                try:
-                    status, next_state = current_stage.start(**self.state)
+        self._update_state(next_state)
 
-                # continue to the next stage
-                except StageAbort:
-                    status, next_state = (0, dict())
-                    just_finished = 1
-                    self.next_stage()
-                    return (0, None)
+        # the stage finished, setup the next stage
+        if status:
+            return self._finish_stage()
+        return (0, None)
 
-                # StageReset == Ignore when stage not started
-                except (StageReset, Ignore):
-                    return (0, None)
+    def _start_stage(self):
+        """
+        Run handler for a Stage that hasn't been started yet.
+        """
 
-                # handle trial_results the same way as with a BlockingStage
-                if "trial_results" in next_state:
-                    self.results.add_data(next_state["trial_results"])
+        # checkpoint the current state in case the stage has to be restarted
+        self.checkpoint_state()
 
-                # update the state
-                self.state.update(next_state)
+        # start the stage. if starting succeeds, update status to running
+        tag, status, next_state = _invoke(self._start_fns[self.stage_index], self.state)
 
+        # continue to the next stage
+        if tag == _ABORT:
+            return self._finish_stage()
 
-                # the stage was started successfully.
-                if status:
-                    self.set_running()
+        # StageReset == Ignore when stage not started
+        if tag != _OK:
+            return (0, None)
 
-        # stage is running
-        else:
-            try:
-                status, next_state = current_stage.is_done(**self.state)
-
-            # continue to the next stage
-            except StageAbort:
-                status, next_state = (0, dict())
-                just_finished = 1
-                self.next_stage()
-                return (0, None)
-
-            # reset the state to its value at the beginning of this stage
-            # and restart it.
-            except StageReset:
-                self.reset_stage()
-                return (0, None)
-
-            # do nothing, return not done
-            except Ignore:
-                return (0, None)
+        self._update_state(next_state)
 
-            if "trial_results" in next_state:
-                self.results.add_data(next_state["trial_results"])
+        # the stage was started successfully.
+        if status:
+            self.set_running()
+        return (0, None)
 
-            # update the state
-            self.state.update(next_state)
+    def _poll_stage(self):
+        """
+        Run handler for a Stage that is running. Checks if it's done.
+        """
 
-            # stage is done
-            if status:
-                just_finished = 1
-                self.next_stage()
-                self.unset_running()
+        tag, status, next_state = _invoke(self._done_fns[self.stage_index], self.state)
 
-        # If this is the last stage and the stage just finished mark as done
-        # and return the results.
-        if self.stage_index == len(self.stages) and just_finished:
-            self.done = True
-            return (1, self.results)
-        else:
+        # continue to the next stage
+        if tag == _ABORT:
+            return self._finish_stage()
+
+        # reset the state to its value at the beginning of this stage
+        # and restart it.
+        if tag == _RESET:
+            self.reset_stage()
+            return (0, None)
+
+        # do nothing, return not done
+        if tag == _IGNORE:
             return (0, None)
 
+        self._update_state(next_state)
+
+        # stage is done
+        if status:
+            return self._finish_stage()
+        return (0, None)
+
+    async def run_async(self, sleep_time, executor = None, max_sleep = None):
+        """
+        Calls run until the Trial finishes, awaiting the current stage's wait
+        method between calls instead of blocking the thread. If an executor
+        is given, every call of run is made in it, so blocking calls in stages
+        overlap with the other Trials. Otherwise only BlockingStages are
+        started in the event loop's default executor.
+
+        The wait starts at sleep_time and doubles, up to max_sleep, each time
+        a call of run doesn't start or finish a stage or add results. It drops
+        back to sleep_time as soon as one does. Without max_sleep, the wait is
+        always sleep_time.
+
+        Returns:
+            the (status, results) tuple from the call of run that finished the
+            Trial.
+        """
+
+        if max_sleep is None:
+            max_sleep = sleep_time
+
+        loop = asyncio.get_running_loop()
+        delay = sleep_time
+        while True:
+            position = (self.stage_index, self.running, len(self.results.data))
+
+            if executor is not None:
+                status, results = await loop.run_in_executor(executor, self.run)
+            elif not self.done and not self.running and \
+            self._is_blocking[self.stage_index]:
+                status, results = await loop.run_in_executor(None, self.run)
+            else:
+                status, results = self.run()
+
+            if status:
+                return (status, results)
+
+            # back off while the trial is stuck on the same stage without
+            # producing results
+            if (self.stage_index, self.running, len(self.results.data)) != position:
+                delay = sleep_time
+            else:
+                delay = min(delay * 2, max_sleep)
+
+            # stages don't have to subclass Stage, so they may not have wait
+            wait = getattr(self.stages[self.stage_index], "wait", None)
+            if wait is None:
+                await asyncio.sleep(delay)
+            else:
+                await wait(delay)
+
     def start(self, *args, **kwargs):
         self.current_stage = stages[0]
         self.current_stage.start(*args, **kwargs)
@@ -340,15 +524,39 @@ class Experiment:
 
     """
     The experiment class holds a list of Trial objects. The experiment runs
-    in a single thread and iterates through each trial, checking if it's
-    finished. If it is, it collects and ships the results and starts a new
-    trial in its place, using the arguments for the next trial.
+    the trials concurrently on an asyncio event loop, with the trials' stages
+    running in a thread pool of up to max_workers threads. With a max_workers
+    of 0 or None there's no pool, and stages are polled on the event loop's
+    thread, apart from BlockingStage starts. When a trial finishes, it
+    collects and ships the results and starts a new trial in its place, using
+    the arguments for the next trial. Stages are polled every sleep_time seconds. If max_sleep is
+    given, polling backs off to at most every max_sleep seconds while a stage
+    isn't making progress.
+
+    Results are queued and passed to ship_results_batch once batch_size
+    results are waiting, and every flush_interval seconds while the experiment
+    runs. Anything left over is shipped when the run ends.
     """
 
-    def __init__(self, base_trial_config = dict(), per_instance_config = list(), trial_arg_configs = list(), stages = [], trial_class=Trial, sleep_time=0.01, error_sequence = list(), trial_error_sequence = list(), stage_error_sequence = list()):
-
-        # build stage objects with error_sequences
-        def build_stage_objects(stages, stage_error_sequence):
+    def __init__(self, base_trial_config = None, per_instance_config = None, trial_arg_configs = None, stages = None, trial_class=Trial, sleep_time=0.01, error_sequence = None, trial_error_sequence = None, stage_error_sequence = None, batch_size = 1, flush_interval = 1.0, max_sleep = None, max_workers = 32):
+        if base_trial_config is None:
+            base_trial_config = dict()
+        if per_instance_config is None:
+            per_instance_config = list()
+        if trial_arg_configs is None:
+            trial_arg_configs = list()
+        if stages is None:
+            stages = list()
+        if error_sequence is None:
+            error_sequence = ()
+        if trial_error_sequence is None:
+            trial_error_sequence = ()
+        if stage_error_sequence is None:
+            stage_error_sequence = ()
+
+        # validate stage_error_sequence and work out the error sequence for
+        # each stage. None means the stage class is built without one.
+        def build_stage_error_sequences(stages, stage_error_sequence):
 
             # make sure the error sequence is all Exception classes
             # or tuples/lists: (Exception, int)
@@ -375,40 +583,56 @@ class Experiment:
                                         "classes/subclasses.".format(error_sequence))
                     check_error_sequence(l)
 
-            stage_objects = list()
-
             # if stage_error_sequence is a defined per stage
             if stage_error_sequence and \
             isinstance(stage_error_sequence[0], (list, tuple)) and \
             len(stage_error_sequence) == len(stages):
                 check_list_of_error_sequence(stage_error_sequence)
-                for stage_class, error_sequence in zip(stages, stage_error_sequence):
-                    error_sequence = _create_error_sequence(error_sequence)
-                    stage_objects.append(stage_class(error_sequence.copy()))
+                return [_create_error_sequence(error_sequence)
+                        for error_sequence in stage_error_sequence]
 
             # if stage_error_sequence is defined once
             elif stage_error_sequence:
-
                 check_error_sequence(stage_error_sequence)
-                stage_error_sequence = _create_error_sequence(stage_error_sequence)
-                for stage_class in stages:
-                    stage_objects.append(stage_class(stage_error_sequence.copy()))
+                return [_create_error_sequence(stage_error_sequence)] * len(stages)
 
             else:
-                for stage_class in stages:
-                    stage_objects.append(stage_class())
+                return [None] * len(stages)
 
+        # build stage objects with error_sequences. The error sequences are
+        # validated and flattened once, and every stage shares the flattened
+        # tuples, so this is cheap to call per trial instance.
+        def build_stage_objects(stage_error_sequences):
+            stage_objects = list()
+            for stage_class, error_sequence in zip(self.stages, stage_error_sequences):
+                if error_sequence is None:
+                    stage_objects.append(stage_class())
+                else:
+                    stage_objects.append(stage_class(error_sequence))
             return stage_objects
 
         # end build_stage_objects
 
         self.trial_instances = list()
+
+        # base_trial_config merged with each per_instance_config, kept so that
+        # starting a new trial only has to merge in the trial args
+        self._trial_configs = list()
         self.base_trial_config = base_trial_config
         self.per_instance_config = per_instance_config
         self.trial_arg_configs = trial_arg_configs
         self.stages = stages.copy()
         self.sleep_time = sleep_time
+        self.max_sleep = sleep_time if max_sleep is None else max(max_sleep, sleep_time)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_workers = max_workers
+        self._pending = list()
+        self._last_flush = time.monotonic()
         self.error_sequence = _create_error_sequence(error_sequence)
+        self.error_index = 0
+        stage_error_sequences = build_stage_error_sequences(self.stages, stage_error_sequence)
+        trial_error_sequence = _create_error_sequence(trial_error_sequence)
 
         # merge instance configs and base configs for each trial instance, then
         # create and add the new trial instance to the experiment
@@ -417,13 +641,14 @@ class Experiment:
         if type(trial_class) is list:
             if len(per_instance_config) == len(trial_class):
                 for instance, c in zip(per_instance_config, trial_class):
-                    if not issubclass(trial_class, Trial):
+                    if not issubclass(c, Trial):
                         # TODO descriptive error
                         raise
                     trial_config = base_trial_config.copy()
                     trial_config.update(instance)
-                    stage_objects = build_stage_objects(stages, stage_error_sequence.copy())
-                    self.trial_instances.append(c(stage_objects, trial_config, error_sequence = trial_error_sequence.copy()))
+                    self._trial_configs.append(trial_config)
+                    stage_objects = build_stage_objects(stage_error_sequences)
+                    self.trial_instances.append(c(stage_objects, trial_config, error_sequence = trial_error_sequence))
 
             else:
                 # TODO number of classes must match number of instances
@@ -437,8 +662,9 @@ class Experiment:
             for instance in per_instance_config:
                 trial_config = base_trial_config.copy()
                 trial_config.update(instance)
-                stage_objects = build_stage_objects(stages, stage_error_sequence.copy())
-                self.trial_instances.append(trial_class(stage_objects, trial_config, error_sequence = trial_error_sequence.copy()))
+                self._trial_configs.append(trial_config)
+                stage_objects = build_stage_objects(stage_error_sequences)
+                self.trial_instances.append(trial_class(stage_objects, trial_config, error_sequence = trial_error_sequence))
 
         self.errors = [0] * len(self.trial_instances)
 
@@ -446,106 +672,165 @@ class Experiment:
         #print(results.data, results.metadata)
         pass
 
+    def ship_results_batch(self, batch):
+        """
+        Ships a list of results. By default each one is passed to
+        ship_results. Override this to ship a whole batch at once.
+        """
+
+        for results in batch:
+            self.ship_results(results)
+
+    def queue_results(self, results):
+        """
+        Adds results to the pending batch, shipping the batch if it's full or
+        the flush interval has passed.
+        """
+
+        self._pending.append(results)
+        if len(self._pending) >= self.batch_size or \
+        time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush_results()
+
+    def flush_results(self):
+        """
+        Ships all pending results.
+        """
+
+        if self._pending:
+            batch = self._pending
+            self._pending = list()
+            self.ship_results_batch(batch)
+        self._last_flush = time.monotonic()
+
     def log_error(self, state):
         #print(state)
         pass
 
     @handle_exceptions
     def run(self):
-        trial_index = 0
-        done = False
+        """
+        Runs the experiment to completion with asyncio.run. That starts a new
+        event loop, so this can't be called while one is already running in
+        the thread (in Jupyter, for example). Await run_async there instead.
+        """
 
-        # while there are still trials to start
-        while len(self.trial_arg_configs) > 0:
-            trial = self.trial_instances[trial_index]
+        asyncio.run(self.run_async())
+
+    async def run_async(self):
+        """
+        Drives every trial instance concurrently on a single event loop. Each
+        instance only wakes up when its current stage is ready to be polled
+        again.
+        """
+
+        # trial args are handed out in order by a shared iterator, leaving
+        # trial_arg_configs itself intact so the experiment can be run again
+        self._arg_iter = iter(self.trial_arg_configs)
+
+        # ship queued results every flush_interval seconds, even while no
+        # trials are finishing
+        flusher = None
+        if self.flush_interval > 0:
+            flusher = asyncio.ensure_future(self._flush_periodically())
+
+        # ship whatever is still queued, even if the run is cut short
+        try:
+
+            # stages are mostly I/O bound, so each trial instance runs its
+            # stages in this pool to overlap them. The pool only lives for the
+            # run. Leaving the with block waits for stage calls still in
+            # flight, so the run can't return while stages are running.
+            if self.max_workers:
+                max_workers = max(1, min(self.max_workers, len(self.trial_instances)))
+                with ThreadPoolExecutor(max_workers = max_workers) as pool:
+                    await self._drive_all(pool)
+
+            # without a pool, stages are polled in the event loop's thread
+            else:
+                await self._drive_all(None)
+        finally:
+            if flusher is not None:
+                flusher.cancel()
+            self.flush_results()
+
+    async def _drive_all(self, pool):
+        """
+        Drives every trial instance until they're all finished, making stage
+        calls in pool.
+        """
+
+        drivers = [asyncio.ensure_future(self._drive(trial, trial_index, pool))
+            for trial_index, trial in enumerate(self.trial_instances)]
+        try:
+            await asyncio.gather(*drivers)
+
+        # if a trial raised, stop the others from starting any more stage
+        # calls and let them unwind before the pool shuts down
+        finally:
+            for driver in drivers:
+                driver.cancel()
+            await asyncio.gather(*drivers, return_exceptions = True)
+
+    async def _flush_periodically(self):
+        """
+        Ships the pending results every flush_interval seconds until it's
+        cancelled.
+        """
+
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush_results()
+
+    async def _drive(self, trial, trial_index, pool):
+        """
+        Runs trials on a single trial instance, shipping results and starting
+        the next trial with the next set of args, until there are no args
+        left.
+        """
+
+        # local aliases for the attributes used on every pass of the loop
+        run_async = trial.run_async
+        sleep_time = self.sleep_time
+        max_sleep = self.max_sleep
+        queue_results = self.queue_results
+        arg_iter = self._arg_iter
+        trial_config = self._trial_configs[trial_index]
+
+        while True:
 
             # run the trial, handle all relevant exceptions
             try:
-                status, results = trial.run()
+                status, results = await run_async(sleep_time, pool, max_sleep)
 
             # reset the trial and try again
             except TrialReset:
                 status = 0
-                results = trial.results
-
-                # grab partial results if they're there
-                # if "trial_results" in trial.state:
-                #     results = trial.state["trial_results"]
-                # else:
-                #     results = 0
-
+                results = trial.results # send partial results
                 trial.reset()
 
-            # continue to the next trial
+            # mark the trial as done and continue to the next trial
             except TrialAbort:
                 status = 1
-                results = trial.results
-
-                # grab partial results if they're there
-                # if "trial_results" in trial.state:
-                #     results = trial.state["trial_results"]
-                # else:
-                #     results = 0
+                results = trial.results # send partial results
+                trial.set_done()
 
             # ignore the exception, hope it resolves itself in the future
             except Ignore:
                 status, results = (0, 0)
+                await asyncio.sleep(sleep_time)
 
             # results were provided by the run
             if results:
-                self.ship_results(results)
+                queue_results(results)
 
             # if status > 0, the trial is finished. continue to the next set of
             # args.
             if status:
-                copy = self.base_trial_config.copy()
-                instance_config = self.per_instance_config[trial_index]
-
-                # if there're any trials left to complete, start the next one
-                if len(self.trial_arg_configs) > 0:
-                    trial.new_trial(**copy, **instance_config, **self.trial_arg_configs.pop())
-
-            # increment trial index
-            trial_index = (trial_index + 1) % len(self.trial_instances)
-
-            # sleep to help rate limit
-            time.sleep(self.sleep_time)
-
-        # while there are still trials running after all have been started
-        while not done:
-
-            #check each trial to see if it's done
-            done = True
-            for trial, trial_index in zip(self.trial_instances, range(len(self.trial_instances))):
-
-
-                # run the trial, handle all relevant exceptions
-                try:
-                    status, results = trial.run()
-
-                # reset the trial and try again
-                except TrialReset:
-                    status = 0
-                    results = trial.results # send partial results
-                    trial.reset()
-
-                # mark the trial as done and continue
-                except TrialAbort:
-                    status = 1
-                    results = trial.results # send partial results
-                    trial.set_done()
-
-                # ignore the exception, hope it resolves itself in the future
-                except Ignore:
-                    status, results = (0, 0)
-
-                # results were returned
-                if results:
-                    self.ship_results(results)
 
-                # if status is false, the trial is still incomplete.
-                if not status:
-                    done = False
+                # no trials left to start, this trial instance is finished
+                trial_args = next(arg_iter, None)
+                if trial_args is None:
+                    return
 
-            # sleep to rate limit
-            time.sleep(self.sleep_time)
+                trial.new_trial(**{**trial_config, **trial_args})
@@ -75,6 +75,37 @@ class Ignore(ExperimentException):
     """
     pass
 
+def _next_error(obj):
+    """
+    Moves obj along its error sequence after an unexpected exception.
+
+    Returns:
+        the exception class to raise in place of the unexpected exception, or
+        None if the error sequence is used up and the exception should be
+        elevated as is.
+    """
+
+    # error_sequence is an immutable tuple. error_index points at the next
+    # exception class to raise. Subclasses that set error_sequence without
+    # calling Stage.__init__ have no error_index until the first exception.
+    error_sequence = obj.error_sequence
+    index = getattr(obj, "error_index", 0)
+
+    # if error sequence is used up, elevate the exception
+    if index >= len(error_sequence):
+        return None
+
+    # A zero following an Exception type signals that the Exception should be
+    # raised indefinitely
+    elif index + 1 < len(error_sequence) and error_sequence[index + 1] == 0:
+        return error_sequence[index]
+
+    # By default, move past the exception class in error_sequence and return
+    # it
+    else:
+        obj.error_index = index + 1
+        return error_sequence[index]
+
 # decorator to add automatic exception handling to the functions of either an
 # Experiment, Trial, or Stage subclass.
 def handle_exceptions(func):
@@ -90,18 +121,8 @@ def handle_exceptions(func):
 
         except Exception as err:
             logging.exception(err)
-
-            # if error sequence is empty, elevate the exception
-            if not self.error_sequence:
+            error = _next_error(self)
+            if error is None:
                 raise
-
-            # A zero following an Exception type signals that the Exception
-            # should be raised indefinitely
-            elif len(self.error_sequence) >1 and self.error_sequence[1] ==0:
-                raise self.error_sequence[0]
-
-            # By default, pop the exception class off error_sequence and
-            # raise it
-            else:
-                raise self.error_sequence.pop(0)
+            raise error
     return try_function
@@ -3,6 +3,8 @@ This file holds the classes used to simplify and organize resource acquisition.
 """
 
 from multiprocessing import (BoundedSemaphore, Semaphore)
+from collections import OrderedDict
+from itertools import islice
 import logging
 
 class ResourceWarden:
@@ -13,17 +15,31 @@ class ResourceWarden:
         self.timeout = timeout
 
     def acquire(self, *resources):
+
+        # local aliases, since this loops over every requested resource
+        resource_dict = self.resource_dict
+        block = self.block
+        timeout = self.timeout
         acquired = list()
+        append = acquired.append
+
         for resource in resources:
+
+            # a resource name, acquired with the warden's block and timeout
             if type(resource) is str:
-                success = self.resource_dict[resource].acquire(block = self.block, timeout = self.timeout)
+                success = resource_dict[resource].acquire(block, timeout)
                 if success:
-                    acquired.append(resource)
+                    append(resource)
+
+            # resource names mapped to their own acquire kwargs. stop at the
+            # first one that can't be acquired.
             elif type(resource) is dict:
-                for r in resource:
-                    success = self.resource_dict[r].acquire(**resource[r])
-                    if success:
-                        acquired.append(r)
+                success = True
+                for r, kwargs in resource.items():
+                    success = resource_dict[r].acquire(**kwargs)
+                    if not success:
+                        break
+                    append(r)
             else:
                 raise TypeError("Resources must be either str or dict: not {} ({})".format(type(resource), resource))
             if not success:
@@ -40,49 +56,104 @@ class ResourceWarden:
 
 class ResourceContainer(ResourceWarden):
 
-    def __init__(self, resource_warden, resources = list()):
-        self.resources = resources.copy()
+    def __init__(self, resource_warden, resources = None):
+
+        # held resource names, keyed by an id that increases with every
+        # acquisition. Unlike a list, an OrderedDict can drop a resource from
+        # the middle without shifting everything after it.
+        self._held = OrderedDict()
+        self._next_id = 0
         self.resource_warden = resource_warden
+        if resources is not None:
+            self._add(resources)
 
         # this is used to temporarily group consecutively acquired resources
         # together in case they have to be released during exception handling.
-        # It is an index in the self.resources list. The marker sits between
-        # the resource at the index and the resource before it, meaning the
-        # resource at the index is included in the current chunk.
-        self.chunk_marker = 0
+        # It is the id of the first resource in the current chunk, so every
+        # resource with an id >= _chunk_id is in the chunk. Releasing
+        # resources never moves it.
+        self._chunk_id = 0
+
+    @property
+    def resources(self):
+        """
+        Names of the held resources, in the order they were acquired. This is
+        a snapshot in a tuple, since changing it wouldn't change what the
+        container holds. Use acquire and release instead.
+        """
+
+        return tuple(self._held.values())
+
+    @property
+    def chunk_marker(self):
+        """
+        Index in self.resources of the first resource in the current chunk.
+        The marker sits between the resource at the index and the resource
+        before it, meaning the resource at the index is included in the
+        current chunk.
+        """
+
+        marker = 0
+        for key in self._held:
+            if key >= self._chunk_id:
+                break
+            marker += 1
+        return marker
+
+    @chunk_marker.setter
+    def chunk_marker(self, index):
+        if index < len(self._held):
+            self._chunk_id = next(islice(self._held, index, None))
+        else:
+            self._chunk_id = self._next_id
+
+    def _add(self, resources):
+        for resource in resources:
+            self._held[self._next_id] = resource
+            self._next_id += 1
 
     def acquire(self, *resources):
         if len(resources) == 0:
             return True
         resources = self.resource_warden.acquire(*resources)
         if resources:
-            self.resources += resources
+            self._add(resources)
         return resources
 
     def release(self, index = -1):
-        resource = self.resource_warden.release(self.resources[index])
-        if resource:
-            self.resources.pop(index)
 
-            # If a resource is released which sits behind the chunk marker, set
-            # the chunk marker back one.
-            if len(self.resources) > 0 and (len(self.resources) + index) % len(self.resources) < self.chunk_marker:
-                self.chunk_marker -= 1
-                if self.chunk_marker < 0:
-                    raise Exception("ResourceContainer chunk_marker somehow dropped below 0.")
+        # index counts the held resources in order, like a list index.
+        # normalize it once, then walk to it from the closer end.
+        held = self._held
+        n = len(held)
+        pos = index if index >= 0 else n + index
+        if not 0 <= pos < n:
+            raise IndexError("ResourceContainer index out of range")
+        if pos < n // 2:
+            key = next(islice(held, pos, None))
+        else:
+            key = next(islice(reversed(held), n - 1 - pos, None))
+
+        resource = self.resource_warden.release(held[key])
+        if resource:
+            del held[key]
 
         return resource
 
     def release_chunk(self, num = None):
         released = list()
         if num == None:
-            num = len(self.resources) - self.chunk_marker
+            num = 0
+            for key in reversed(self._held):
+                if key < self._chunk_id:
+                    break
+                num += 1
         for i in range(num):
             released.append(self.release())
         return released
 
     def reset_chunk_marker(self):
-        self.chunk_marker = len(self.resources)
+        self._chunk_id = self._next_id
 
     def release_all(self):
-        return self.release_chunk(len(self.resources))
+        return self.release_chunk(len(self._held))
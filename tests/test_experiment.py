@@ -0,0 +1,272 @@
+"""
+Tests for the experiment framework. Run from the repository root with:
+
+    python -m unittest discover -s tests
+"""
+
+import logging
+import unittest
+from multiprocessing import BoundedSemaphore
+
+from experiment import (Stage, Trial, Experiment, ResourceWarden,
+                        ResourceContainer, StageReset, TrialReset, TrialAbort,
+                        Ignore, handle_exceptions)
+from experiment.experiment import _create_error_sequence
+
+# the error sequence tests log every unexpected exception they cause
+logging.disable(logging.CRITICAL)
+
+def run_trial(trial):
+    """
+    Calls run until the trial finishes and returns its results.
+    """
+
+    while True:
+        status, results = trial.run()
+        if status:
+            return results
+
+class RecordingExperiment(Experiment):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shipped = list()
+
+    def ship_results(self, results, **kwargs):
+        self.shipped.append(results.data)
+
+class TestArgOrder(unittest.TestCase):
+
+    class ArgStage(Stage):
+        def start(self, **kwargs):
+            return 1, {}
+
+        def is_done(self, arg, **kwargs):
+            return 1, {"trial_results": arg}
+
+    def test_single_instance_consumes_args_in_order(self):
+        e = RecordingExperiment(per_instance_config = [{}],
+                                trial_arg_configs = [{"arg": i} for i in range(5)],
+                                stages = [self.ArgStage], sleep_time = 0)
+        e.run()
+        self.assertEqual(e.shipped, [[i] for i in range(5)])
+
+    def test_instances_take_args_in_order(self):
+
+        # without a pool every instance is started synchronously, so the first
+        # pass hands instance i the i-th args
+        e = RecordingExperiment(per_instance_config = [{"n": n} for n in range(3)],
+                                trial_arg_configs = [{"arg": i} for i in range(7)],
+                                stages = [self.ArgStage], sleep_time = 0,
+                                max_workers = None)
+        starts = list()
+        for trial in e.trial_instances:
+            new_trial = trial.new_trial
+            def record(*args, _new_trial = new_trial, **kwargs):
+                starts.append((kwargs["n"], kwargs["arg"]))
+                _new_trial(*args, **kwargs)
+            trial.new_trial = record
+        e.run()
+        self.assertEqual(starts[:3], [(0, 0), (1, 1), (2, 2)])
+        self.assertEqual([arg for n, arg in starts], list(range(7)))
+
+    def test_every_arg_used_once_with_pool(self):
+        e = RecordingExperiment(per_instance_config = [{}] * 3,
+                                trial_arg_configs = [{"arg": i} for i in range(10)],
+                                stages = [self.ArgStage], sleep_time = 0)
+        e.run()
+        self.assertEqual(sorted(e.shipped), [[i] for i in range(10)])
+
+        # trial_arg_configs is left intact, so the experiment can run again
+        e.run()
+        self.assertEqual(len(e.shipped), 20)
+
+class TestPartialResults(unittest.TestCase):
+
+    def run_experiment(self, exception):
+
+        class FailingStage(Stage):
+            raised = False
+
+            def start(self, **kwargs):
+                return 1, {"trial_results": "partial"}
+
+            def is_done(self, **kwargs):
+                if not FailingStage.raised:
+                    FailingStage.raised = True
+                    raise exception
+                return 1, {"trial_results": "done"}
+
+        e = RecordingExperiment(per_instance_config = [{}],
+                                trial_arg_configs = [{}], stages = [FailingStage],
+                                sleep_time = 0)
+        e.run()
+        return e.shipped
+
+    def test_trial_reset_ships_partial_results(self):
+        self.assertEqual(self.run_experiment(TrialReset),
+                         [["partial"], ["partial", "done"]])
+
+    def test_trial_abort_ships_partial_results(self):
+        self.assertEqual(self.run_experiment(TrialAbort), [["partial"]])
+
+class TestStageReset(unittest.TestCase):
+
+    class ResetStage(Stage):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.started_with = list()
+            self.polls = 0
+
+        def start(self, **kwargs):
+            self.started_with.append(kwargs)
+            return 1, {"a": kwargs["a"] + 1, "added": True}
+
+        def is_done(self, **kwargs):
+            self.polls += 1
+            if self.polls == 1:
+                raise StageReset
+            return 1, {"trial_results": kwargs["a"]}
+
+    def test_rolls_back_changed_and_added_keys(self):
+        first, second = self.ResetStage(), self.ResetStage()
+        trial = Trial([first, second], {"a": 0})
+        trial.new_trial()
+        results = run_trial(trial)
+
+        # the first stage restarts from the initial state
+        self.assertEqual(first.started_with, [{"a": 0}, {"a": 0}])
+
+        # the second stage restarts from the state the first one left
+        self.assertEqual(second.started_with,
+                         [{"a": 1, "added": True, "trial_results": 1}] * 2)
+        self.assertEqual(results.data, [1, 2])
+
+    def test_initial_state_is_untouched(self):
+        stage = self.ResetStage()
+        trial = Trial([stage], {"a": 0})
+        trial.new_trial()
+        trial.run()
+        trial.state["direct"] = 1
+        trial.run()
+        self.assertEqual(trial.state, {"a": 0})
+        self.assertEqual(trial.initial_state, {"a": 0})
+
+class TestErrorSequence(unittest.TestCase):
+
+    class FailingStage(Stage):
+        @handle_exceptions
+        def start(self, **kwargs):
+            raise ValueError
+
+    def raised(self, stage, calls):
+        raised = list()
+        for i in range(calls):
+            try:
+                stage.start()
+            except Exception as e:
+                raised.append(type(e))
+        return raised
+
+    def test_flatten(self):
+        sequence = _create_error_sequence([(StageReset, 2), TrialReset, (Ignore, 0)])
+        self.assertEqual(sequence, (StageReset, StageReset, TrialReset, Ignore, 0))
+
+        # an already flattened sequence is shared rather than rebuilt
+        self.assertIs(_create_error_sequence(sequence), sequence)
+
+    def test_zero_count_repeats_forever(self):
+        stage = self.FailingStage([(StageReset, 2), (Ignore, 0)])
+        self.assertEqual(self.raised(stage, 5),
+                         [StageReset, StageReset, Ignore, Ignore, Ignore])
+        self.assertEqual(stage.error_index, 2)
+
+    def test_used_up_sequence_elevates(self):
+        stage = self.FailingStage([StageReset])
+        self.assertEqual(self.raised(stage, 3), [StageReset, ValueError, ValueError])
+
+    def test_reset_error_sequence(self):
+        stage = self.FailingStage([StageReset, TrialReset])
+        self.assertEqual(self.raised(stage, 2), [StageReset, TrialReset])
+        stage.reset_error_sequence()
+        self.assertEqual(self.raised(stage, 1), [StageReset])
+
+    def test_stages_share_the_sequence(self):
+        e = Experiment(per_instance_config = [{}] * 2,
+                       stages = [self.FailingStage],
+                       stage_error_sequence = [StageReset, (Ignore, 0)])
+        a, b = (trial.stages[0] for trial in e.trial_instances)
+        self.assertIs(a.error_sequence, b.error_sequence)
+        self.assertEqual(self.raised(a, 3), [StageReset, Ignore, Ignore])
+        self.assertEqual(b.error_index, 0)
+
+class TestResourceContainer(unittest.TestCase):
+
+    def setUp(self):
+        self.warden = ResourceWarden({name: BoundedSemaphore(4) for name in "abcdef"})
+        self.container = ResourceContainer(self.warden)
+
+    def test_resources_is_read_only(self):
+        self.container.acquire("a", "b")
+        self.assertEqual(self.container.resources, ("a", "b"))
+        with self.assertRaises(AttributeError):
+            self.container.resources.append("c")
+
+    def test_chunk_marker(self):
+        c = self.container
+        c.acquire("a", "b")
+        c.reset_chunk_marker()
+        self.assertEqual(c.chunk_marker, 2)
+        c.acquire("c", "d")
+        self.assertEqual(c.chunk_marker, 2)
+
+        # releasing before the marker shifts it with the resources
+        self.assertEqual(c.release(0), ["a"])
+        self.assertEqual(c.resources, ("b", "c", "d"))
+        self.assertEqual(c.chunk_marker, 1)
+
+        # releasing inside the chunk leaves it in place
+        self.assertEqual(c.release(-2), ["c"])
+        self.assertEqual(c.chunk_marker, 1)
+
+        c.chunk_marker = 0
+        self.assertEqual(c.chunk_marker, 0)
+
+    def test_release_chunk(self):
+        c = self.container
+        c.acquire("a")
+        c.reset_chunk_marker()
+        c.acquire("b", "c")
+        self.assertEqual(c.release_chunk(), [["c"], ["b"]])
+        self.assertEqual(c.resources, ("a",))
+        self.assertEqual(c.release_chunk(), [])
+
+        # the marker stays put, so resources acquired later form the chunk
+        c.acquire("d")
+        self.assertEqual(c.release_chunk(), [["d"]])
+
+    def test_release_matches_list(self):
+        c = self.container
+        expected = list("abcdef")
+        c.acquire(*expected)
+        for index in (3, -1, 0, -2, 1, 0):
+            self.assertEqual(c.release(index), [expected.pop(index)])
+            self.assertEqual(c.resources, tuple(expected))
+        with self.assertRaises(IndexError):
+            c.release()
+
+    def test_release_all(self):
+        c = self.container
+        c.acquire("a", "b", "c")
+        c.reset_chunk_marker()
+        self.assertEqual(c.release_all(), [["c"], ["b"], ["a"]])
+        self.assertEqual(c.resources, ())
+
+        # every semaphore was released back to its starting value
+        for semaphore in self.warden.resource_dict.values():
+            for i in range(4):
+                self.assertTrue(semaphore.acquire(False))
+            self.assertFalse(semaphore.acquire(False))
+
+if __name__ == "__main__":
+    unittest.main()